@@ -129,14 +129,17 @@ def main():
             col1, _ = st.columns([3, 1])
             with col1:
                 if st.button("Explain This Query", key="analyze_button"):
+                    # Render the narrative as it streams in
+                    narrative_box = st.empty()
                     with st.spinner("Thinking..."):
                         schema_config = schema_editor.db_manager.get_schema_config(st.session_state.active_connection_id)
                         narrative = get_query_generator().analyze_result(
                             st.session_state.current_results,
                             st.session_state.current_question,
-                            config=schema_config.get('config') if schema_config else None
+                            config=schema_config.get('config') if schema_config else None,
+                            on_text=narrative_box.info
                         )
-                        st.info(narrative)
+                    narrative_box.info(narrative)
 
 if __name__ == "__main__":
     main()
@@ -1,47 +1,96 @@
 """Database manager for handling all database operations."""
 import os
 import json
+import functools
 import logging
+import threading
+import time
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-from typing import Optional, Dict, List, Any, Tuple
+from datetime import datetime, date
+from decimal import Decimal
+from typing import TYPE_CHECKING, Optional, Dict, List, Any, Tuple
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
 from .models import Base, User, Connection, SchemaConfig
-import snowflake.connector
 import traceback
 import math
 import numpy as np
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from .models import Base, User, Connection, SchemaConfig, QueryHistory, InteractionLog
+from .models import Base, User, Connection, SchemaConfig, QueryHistory, InteractionLog, generate_uuid
+
+if TYPE_CHECKING:
+    import snowflake.connector
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Schema configs are read on every rerun of the schema editor and every question;
+# the TTL bounds staleness from edits made by other processes
+SCHEMA_CONFIG_CACHE_TTL_SECONDS = 300
+
 @st.cache_resource
 def get_database_manager():
     """Get or create DatabaseManager instance."""
     return DatabaseManager()
 
+@functools.lru_cache(maxsize=8)
+def load_private_key_der(private_key_content: bytes) -> bytes:
+    """Convert an unencrypted PEM private key to the PKCS8 DER bytes Snowflake expects.
+    
+    Keyed on the PEM bytes, so reconnects skip the RSA parse and a rotated key
+    is simply a new entry.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key
+    
+    private_key_obj = load_pem_private_key(
+        private_key_content,
+        password=None  # We generated unencrypted key
+    )
+    return private_key_obj.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
 def sanitize_for_json(obj):
-    """Recursively replace NaN/Infinity/numpy types with None or native Python types."""
+    """Recursively replace NaN/Infinity/numpy/Decimal/datetime values with JSON-safe types."""
     if isinstance(obj, float):
         if math.isnan(obj) or math.isinf(obj):
             return None
-    if isinstance(obj, (np.floating,)):
+    if isinstance(obj, (np.floating, Decimal)):
         val = float(obj)
         if math.isnan(val) or math.isinf(val):
             return None
         return val
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
     if isinstance(obj, dict):
         return {k: sanitize_for_json(v) for k, v in obj.items()}
-    if isinstance(obj, list):
+    if isinstance(obj, (list, tuple)):
         return [sanitize_for_json(v) for v in obj]
-    return obj
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    # Anything else (e.g. datetime.time from TIME columns, bytes from BINARY) is stored as text
+    return str(obj)
+
+def _json_safe(obj):
+    """Return obj unchanged if it is already strict JSON, else a sanitized copy.
+    
+    The C encoder rejects NaN/Infinity (allow_nan=False) and non-JSON types, so
+    the common all-plain payload skips the recursive Python walk.
+    """
+    try:
+        json.dumps(obj, allow_nan=False)
+        return obj
+    except (TypeError, ValueError):
+        return sanitize_for_json(obj)
 
 class DatabaseManager:
     """Database manager class."""
@@ -72,15 +121,21 @@ class DatabaseManager:
         Base.metadata.create_all(self.engine)
         logger.info("Tables set up, creating session maker")
         self.Session = sessionmaker(bind=self.engine)
+        # connection_id -> (loaded_at, schema config id, config as JSON)
+        self._schema_config_cache = {}
+        # connection_id -> invalidation count, so a read that raced an update isn't cached
+        self._schema_config_generation = {}
+        self._schema_config_lock = threading.Lock()
         logger.info("DatabaseManager initialization complete")
 
-    def _get_snowflake_connection(self, config: Dict) -> snowflake.connector.SnowflakeConnection:
+    def _get_snowflake_connection(self, config: Dict) -> 'snowflake.connector.SnowflakeConnection':
         """Create Snowflake connection using private key authentication only."""
         # Mask sensitive info in logs
         safe_config = {k: '***' if k in ['private_key_path'] else v 
                     for k, v in config.items()}
-        logger.info("Attempting to connect to Snowflake with config: " + 
-                json.dumps(safe_config, indent=2))
+        logger.info("Attempting to connect to Snowflake")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Snowflake connection config: " + json.dumps(safe_config, indent=2))
         
         try:
             # Base connection parameters
@@ -121,30 +176,16 @@ class DatabaseManager:
                 
                 logger.info(f"Private key content length: {len(private_key_content)} bytes")
                 
-                # Parse the private key
-                from cryptography.hazmat.primitives import serialization
-                from cryptography.hazmat.primitives.serialization import load_pem_private_key
-                
-                private_key_obj = load_pem_private_key(
-                    private_key_content,
-                    password=None
-                )
-                
-                # Convert to DER format for Snowflake
-                private_key_der = private_key_obj.private_bytes(
-                    encoding=serialization.Encoding.DER,
-                    format=serialization.PrivateFormat.PKCS8,
-                    encryption_algorithm=serialization.NoEncryption()
-                )
-                
-                connection_params['private_key'] = private_key_der
+                # Parse the private key and convert to DER format for Snowflake
+                connection_params['private_key'] = load_private_key_der(private_key_content)
                 logger.info("Using private key authentication")
                 
             except Exception as e:
                 logger.error(f"Failed to load private key: {str(e)}")
                 raise ValueError(f"Failed to load private key: {str(e)}")
             
-            # Create connection
+            # Create connection; the connector is only imported once a connection is needed
+            import snowflake.connector
             conn = snowflake.connector.connect(**connection_params)
             logger.info("Successfully connected to Snowflake")
             return conn
@@ -445,7 +486,9 @@ class DatabaseManager:
             logger.info("Starting schema introspection for new connection")
             schema_config = self.introspect_schema(connection_id)
             if schema_config:
-                logger.info(f"Updating schema config with introspected schema: {json.dumps(schema_config, indent=2)}")
+                logger.info("Updating schema config with introspected schema")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Introspected schema: {json.dumps(schema_config, indent=2)}")
                 if self.update_schema_config(connection_id, schema_config):
                     logger.info("Schema config updated successfully")
                 else:
@@ -527,8 +570,10 @@ class DatabaseManager:
                 session.add(schema_config)
             
             session.commit()
+            self._invalidate_schema_config(connection_id)
             logger.info("Schema config updated successfully")
-            logger.info(f"Final config in database: {json.dumps(schema_config.config, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Final config in database: {json.dumps(schema_config.config, indent=2)}")
             return True
         except Exception as e:
             logger.error(f"Error updating schema config: {str(e)}")
@@ -538,8 +583,30 @@ class DatabaseManager:
         finally:
             session.close()
 
+    def _invalidate_schema_config(self, connection_id: str):
+        """Drop the cached schema config so the next read goes to the database."""
+        with self._schema_config_lock:
+            self._schema_config_cache.pop(connection_id, None)
+            self._schema_config_generation[connection_id] = (
+                self._schema_config_generation.get(connection_id, 0) + 1
+            )
+
     def get_schema_config(self, connection_id: str) -> Optional[Dict]:
-        """Get schema configuration for a connection."""
+        """Get schema configuration for a connection.
+        
+        Served from a per-process cache until the config is updated or the TTL
+        expires. Each call returns a fresh copy, since callers edit it in place.
+        """
+        with self._schema_config_lock:
+            cached = self._schema_config_cache.get(connection_id)
+            generation = self._schema_config_generation.get(connection_id, 0)
+        if cached and time.monotonic() - cached[0] <= SCHEMA_CONFIG_CACHE_TTL_SECONDS:
+            _, config_id, config_json = cached
+            return {
+                'id': config_id,
+                'config': json.loads(config_json)
+            }
+        
         session = self.Session()
         try:
             logger.info(f"Getting schema config for connection: {connection_id}")
@@ -549,7 +616,17 @@ class DatabaseManager:
             
             if schema_config:
                 logger.info("Schema config found")
-                logger.info(f"Config content: {json.dumps(schema_config.config, indent=2)}")
+                # Pretty-printing the whole config is only worth it when debugging
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Config content: {json.dumps(schema_config.config, indent=2)}")
+                # Stored as JSON so every cache hit decodes its own independent copy
+                config_json = json.dumps(schema_config.config)
+                with self._schema_config_lock:
+                    # An update committed during this read makes the result stale; don't cache it
+                    if self._schema_config_generation.get(connection_id, 0) == generation:
+                        self._schema_config_cache[connection_id] = (
+                            time.monotonic(), schema_config.id, config_json
+                        )
                 return {
                     'id': schema_config.id,
                     'config': schema_config.config
@@ -608,6 +685,8 @@ class DatabaseManager:
             # Prepare metadata
             result_metadata = {
                 'row_count': len(result_df),
+                # row_count is the fetch cap, not the full result size, when this is set
+                'rows_truncated': bool(result_df.attrs.get('rows_truncated', False)),
                 'column_count': len(result_df.columns) if not result_df.empty else 0,
                 'columns': list(result_df.columns) if not result_df.empty else [],
                 'execution_time_ms': execution_time_ms
@@ -690,30 +769,86 @@ class DatabaseManager:
         finally:
             session.close()
 
-    def save_interaction_log(self, user_id: str, connection_id: str, thread_id: str, 
+    def save_interaction_log(self, user_id: str, connection_id: str, thread_id: str,
                          interaction_type: str, database_name: str, payload: dict) -> bool:
         """Save interaction log to Supabase for analytics."""
+        return self.save_interaction_logs([{
+            'user_id': user_id,
+            'connection_id': connection_id,
+            'thread_id': thread_id,
+            'interaction_type': interaction_type,
+            'database_name': database_name,
+            'payload': payload
+        }])
+
+    def save_interaction_logs(self, entries: List[Dict[str, Any]]) -> bool:
+        """Bulk save interaction logs to Supabase in a single INSERT round trip."""
+        if not entries:
+            return True
+
         session = self.Session()
         try:
-            # Sanitize payload before saving
-            safe_payload = sanitize_for_json(payload)
+            now = datetime.utcnow()
+            rows = []
+            for entry in entries:
+                rows.append({
+                    'id': generate_uuid(),
+                    'user_id': entry.get('user_id'),
+                    'connection_id': entry.get('connection_id'),
+                    'thread_id': entry['thread_id'],
+                    'interaction_type': entry['interaction_type'],
+                    'database_name': entry.get('database_name'),
+                    # Sanitize payload before saving
+                    'payload': _json_safe(entry.get('payload') or {}),
+                    'created_at': entry.get('created_at') or now
+                })
 
-            interaction_log = InteractionLog(
-                user_id=user_id,
-                connection_id=connection_id,
-                thread_id=thread_id,
-                interaction_type=interaction_type,
-                database_name=database_name,
-                payload=safe_payload
-            )
-            
-            session.add(interaction_log)
+            # Core executemany insert - one statement for the whole batch
+            session.execute(InteractionLog.__table__.insert(), rows)
             session.commit()
             return True
-            
+
+        except (DataError, IntegrityError) as e:
+            logger.error(f"Error saving interaction logs ({len(entries)} entries): {str(e)}")
+            session.rollback()
+            # One bad row shouldn't lose the whole batch; retry row by row
+            return self._save_interaction_log_rows(session, rows)
+        except DBAPIError as e:
+            # Connection-level failure (unreachable, disconnected): every row would fail
+            # the same way, so drop the batch rather than reconnecting once per row
+            logger.error(f"Dropping {len(entries)} interaction logs, database unavailable: {str(e)}")
+            session.rollback()
+            return False
+        except StatementError as e:
+            # Non-DBAPI statement errors come from binding a row's values
+            logger.error(f"Error saving interaction logs ({len(entries)} entries): {str(e)}")
+            session.rollback()
+            return self._save_interaction_log_rows(session, rows)
         except Exception as e:
-            logger.error(f"Error saving interaction log: {str(e)}")
+            logger.error(f"Error saving interaction logs ({len(entries)} entries): {str(e)}")
             session.rollback()
             return False
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+
+    def _save_interaction_log_rows(self, session, rows: List[Dict[str, Any]]) -> bool:
+        """Insert interaction log rows one at a time, skipping any that fail."""
+        failed = 0
+        for index, row in enumerate(rows):
+            try:
+                session.execute(InteractionLog.__table__.insert(), [row])
+                session.commit()
+            except (DataError, IntegrityError) as e:
+                logger.error(f"Error saving interaction log {row.get('interaction_type')}: {str(e)}")
+                session.rollback()
+                failed += 1
+            except DBAPIError as e:
+                # Lost the connection partway through; the remaining rows would fail too
+                logger.error(f"Dropping {len(rows) - index} interaction logs, database unavailable: {str(e)}")
+                session.rollback()
+                return False
+            except StatementError as e:
+                logger.error(f"Error saving interaction log {row.get('interaction_type')}: {str(e)}")
+                session.rollback()
+                failed += 1
+        return failed == 0
\ No newline at end of file
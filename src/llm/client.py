@@ -2,18 +2,58 @@
 import os
 import json
 import time
+import random
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
 import streamlit as st
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Responses to identical deterministic requests, shared across sessions in this process
+RESPONSE_CACHE_TTL_SECONDS = 24 * 60 * 60
+RESPONSE_CACHE_MAX_ENTRIES = 256
+_RESPONSE_CACHE = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+# Settings read from the environment or Streamlit secrets
+_CONFIG_KEYS = (
+    "LLM_MODEL", "LLM_TEMPERATURE", "LLM_MAX_TOKENS", "LLM_TOP_P",
+    "OPENAI_API_KEY", "ANTHROPIC_API_KEY"
+)
+
+def _is_set(value: Any) -> bool:
+    """Present and non-empty; numeric secrets such as LLM_TEMPERATURE = 0 count as set."""
+    return value is not None and value != ''
+
+def _load_config() -> Dict[str, Optional[str]]:
+    """Resolve all LLM settings at once, preferring environment variables over Streamlit secrets."""
+    config = {key: os.getenv(key) for key in _CONFIG_KEYS}
+    missing = [key for key, value in config.items() if not _is_set(value)]
+    if missing:
+        try:
+            # A single pass over secrets; it raises when no secrets file exists
+            secrets = st.secrets
+            for key in missing:
+                config[key] = secrets.get(key)
+        except Exception:
+            pass
+    return config
+
+@st.cache_resource
+def get_llm_client():
+    """Get or create the shared LLMClient instance."""
+    return LLMClient()
+
 class LLMClient:
     """Direct LLM client supporting OpenAI and Anthropic."""
     
     def __init__(self):
         """Initialize LLM client based on configuration."""
+        self._config = _load_config()
         self.model = self._get_config_value("LLM_MODEL")
         self.temperature = float(self._get_config_value("LLM_TEMPERATURE"))
         self.max_tokens = int(self._get_config_value("LLM_MAX_TOKENS", "4096"))
@@ -30,13 +70,13 @@ class LLMClient:
         logger.info(f"Initialized {self.provider} client with model {self.model}")
 
     def _get_config_value(self, key: str, default: str = None) -> str:
-        """Get configuration value from environment or Streamlit secrets."""
-        try:
-            return os.getenv(key) or st.secrets[key]
-        except Exception:
-            if default is not None:
-                return default
-            raise ValueError(f"Configuration {key} not found")
+        """Get configuration value resolved from environment or Streamlit secrets."""
+        value = self._config.get(key)
+        if _is_set(value):
+            return value
+        if default is not None:
+            return default
+        raise ValueError(f"Configuration {key} not found")
 
     def _init_openai_client(self):
         """Initialize OpenAI client."""
@@ -60,24 +100,49 @@ class LLMClient:
         except ImportError:
             raise ImportError("Anthropic package not installed. Run: pip install anthropic")
 
-    def generate(self, prompt: str, max_retries: int = 3) -> str:
-        """Generate response with retry logic and better error handling."""
-        start_time = time.time()
+    def generate(self, prompt: str, max_retries: int = 3,
+                 system: Optional[Union[str, Sequence[str]]] = None,
+                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Generate response with retry logic and better error handling.
+        
+        A system prompt is sent ahead of the user prompt so providers can
+        cache it across calls; keep it free of per-request content. Pass a
+        sequence of blocks ordered from most to least stable so a change in
+        a later block (e.g. per-connection schema) still reuses the earlier ones.
+        
+        When `on_text` is given the response is streamed and the callback
+        receives the full text generated so far after every chunk.
+        """
+        system = self._system_blocks(system)
+        
+        # Sampling makes responses vary, so only temperature 0 calls are cached
+        cache_key = self._cache_key(prompt, system) if self.temperature == 0 else None
+        if cache_key:
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                logger.info(f"{self.provider} response served from cache")
+                if on_text:
+                    on_text(cached)
+                return cached
+        
+        start_time = time.monotonic()
         
         for attempt in range(max_retries):
             try:
                 if self.provider == "openai":
-                    result = self._call_openai(prompt)
+                    result = self._call_openai(prompt, system, on_text)
                 else:
-                    result = self._call_anthropic(prompt)
+                    result = self._call_anthropic(prompt, system, on_text)
                 
                 # Log successful call
-                duration = time.time() - start_time
+                duration = time.monotonic() - start_time
                 logger.info(f"{self.provider} API call succeeded in {duration:.2f}s (attempt {attempt + 1})")
+                if cache_key:
+                    self._cache_response(cache_key, result)
                 return result
                     
             except Exception as e:
-                duration = time.time() - start_time
+                duration = time.monotonic() - start_time
                 error_type = type(e).__name__
                 
                 # Log the error with details
@@ -89,59 +154,129 @@ class LLMClient:
                     raise RuntimeError(f"LLM API failed after {max_retries} attempts: {str(e)}")
                 
                 # Exponential backoff with jitter
-                sleep_time = (2 ** attempt) + (time.time() % 1)  # Add jitter
+                sleep_time = (2 ** attempt) + random.uniform(0, 1)  # Add jitter
                 logger.info(f"Retrying in {sleep_time:.1f} seconds...")
                 time.sleep(sleep_time)
 
-    def _call_openai(self, prompt: str) -> str:
+    def _cache_key(self, prompt: str, system: List[str]) -> str:
+        """Hash everything that determines the response of a deterministic call."""
+        key_source = json.dumps(
+            [self.provider, self.model, self.max_tokens, self.top_p, system, prompt]
+        )
+        return hashlib.blake2b(key_source.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _get_cached_response(self, cache_key: str) -> Optional[str]:
+        """Return a cached response that hasn't expired."""
+        with _RESPONSE_CACHE_LOCK:
+            entry = _RESPONSE_CACHE.get(cache_key)
+            if entry is None:
+                return None
+            cached_at, response = entry
+            if time.monotonic() - cached_at > RESPONSE_CACHE_TTL_SECONDS:
+                del _RESPONSE_CACHE[cache_key]
+                return None
+            _RESPONSE_CACHE.move_to_end(cache_key)
+            return response
+
+    def _cache_response(self, cache_key: str, response: str):
+        """Store a response, evicting the least recently used beyond the size limit."""
+        with _RESPONSE_CACHE_LOCK:
+            _RESPONSE_CACHE[cache_key] = (time.monotonic(), response)
+            _RESPONSE_CACHE.move_to_end(cache_key)
+            while len(_RESPONSE_CACHE) > RESPONSE_CACHE_MAX_ENTRIES:
+                _RESPONSE_CACHE.popitem(last=False)
+
+    def _system_blocks(self, system: Optional[Union[str, Sequence[str]]]) -> List[str]:
+        """Normalize a system prompt into a list of non-empty text blocks."""
+        if not system:
+            return []
+        if isinstance(system, str):
+            return [system]
+        return [block for block in system if block]
+
+    def _call_openai(self, prompt: str, system: Optional[List[str]] = None,
+                     on_text: Optional[Callable[[str], None]] = None) -> str:
         """Make OpenAI API call with improved error handling."""
+        import openai
+        messages = [{"role": "user", "content": prompt}]
+        if system:
+            # OpenAI caches repeated prompt prefixes automatically
+            messages.insert(0, {"role": "system", "content": "\n\n".join(system)})
+        
+        request = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p
+        }
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                top_p=self.top_p
-            )
+            if on_text:
+                content = ""
+                for chunk in self.client.chat.completions.create(stream=True, **request):
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        content += delta
+                        on_text(content)
+            else:
+                response = self.client.chat.completions.create(**request)
+                content = response.choices[0].message.content if response.choices else None
             
-            if not response.choices or not response.choices[0].message.content:
+            if not content:
                 raise ValueError("Empty response from OpenAI API")
                 
-            return response.choices[0].message.content
+            return content
             
-        except Exception as e:
-            # Add context to OpenAI-specific errors
-            if "rate_limit" in str(e).lower():
-                raise RuntimeError(f"OpenAI rate limit exceeded: {str(e)}")
-            elif "quota" in str(e).lower():
-                raise RuntimeError(f"OpenAI quota exceeded: {str(e)}")
-            else:
-                raise
+        except openai.RateLimitError as e:
+            # Add context to OpenAI-specific errors; exhausted quota is reported as a 429 too
+            if getattr(e, 'code', None) == 'insufficient_quota':
+                raise RuntimeError(f"OpenAI quota exceeded: {str(e)}") from e
+            raise RuntimeError(f"OpenAI rate limit exceeded: {str(e)}") from e
 
-    def _call_anthropic(self, prompt: str) -> str:
+    def _call_anthropic(self, prompt: str, system: Optional[List[str]] = None,
+                        on_text: Optional[Callable[[str], None]] = None) -> str:
         """Make Anthropic API call with improved error handling."""
+        import anthropic
+        request = {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        if system:
+            # Each block is a prompt-cache breakpoint (the API allows up to 4)
+            request["system"] = [
+                {"type": "text", "text": block, "cache_control": {"type": "ephemeral"}}
+                for block in system
+            ]
+        
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                top_p=self.top_p,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            if on_text:
+                content = ""
+                with self.client.messages.stream(**request) as stream:
+                    for delta in stream.text_stream:
+                        content += delta
+                        on_text(content)
+            else:
+                response = self.client.messages.create(**request)
+                content = response.content[0].text if response.content else None
             
-            if not response.content or not response.content[0].text:
+            if not content:
                 raise ValueError("Empty response from Anthropic API")
                 
-            return response.content[0].text
+            return content
             
-        except Exception as e:
+        except anthropic.RateLimitError as e:
             # Add context to Anthropic-specific errors
-            if "rate_limit" in str(e).lower():
-                raise RuntimeError(f"Anthropic rate limit exceeded: {str(e)}")
-            elif "quota" in str(e).lower() or "credit" in str(e).lower():
-                raise RuntimeError(f"Anthropic quota/credits exceeded: {str(e)}")
-            else:
-                raise
+            raise RuntimeError(f"Anthropic rate limit exceeded: {str(e)}") from e
+        except anthropic.APIStatusError as e:
+            # Low credit balance has no dedicated error type; only API errors carry that message
+            message = str(e)
+            if "quota" in message.lower() or "credit" in message.lower():
+                raise RuntimeError(f"Anthropic quota/credits exceeded: {message}") from e
+            raise
 
     def get_metrics(self) -> Dict[str, Any]:
         """Get client metrics for monitoring."""
@@ -1,21 +1,32 @@
 """Query generation and execution components."""
-from src.llm.client import LLMClient
+from src.llm.client import get_llm_client
 import pandas as pd
+import pyarrow as pa
 import yaml
 import re
+import math
 from datetime import datetime, date
 import time
 import logging
 import os
-import snowflake.connector
+import atexit
+import functools
+import hashlib
+from contextlib import contextmanager
+from itertools import islice
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from dotenv import load_dotenv
-import sqlparse
 import streamlit as st
-from src.database.db_manager import DatabaseManager
-from src.utils.formatting import format_dataframe
+from src.database.db_manager import get_database_manager, load_private_key_der
+from src.utils.formatting import format_dataframe, summarize_numeric, column_digest, head_records
 from uuid import uuid4
 import json
+import orjson
 from decimal import Decimal
+from typing import Callable, Optional
 
 # Load environment variables
 load_dotenv(override=True)
@@ -40,24 +51,239 @@ try:
 except Exception as e:
     logging.warning(f"Could not set up file logging: {str(e)}")
 
-def decimal_to_float(obj):
-    """Convert Decimal objects to float for JSON serialization."""
+def _setup_qa_chain_logger() -> logging.Logger:
+    """Attach the structured JSON log file to the qa_chain logger once per process."""
+    qa_logger = logging.getLogger('qa_chain')
+    qa_logger.setLevel(logging.INFO)
+    if qa_logger.handlers:
+        return qa_logger
+    
+    try:
+        os.makedirs('logs', exist_ok=True)
+        # Rotate at midnight so a long-running process doesn't keep writing to one day's file
+        json_handler = TimedRotatingFileHandler('logs/qa_chain.json', when='midnight', utc=True)
+        json_handler.setFormatter(logging.Formatter('%(message)s'))
+        
+        # Disk writes happen on the listener thread, off the request path
+        log_queue = queue.Queue(-1)
+        listener = QueueListener(log_queue, json_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        qa_logger.addHandler(QueueHandler(log_queue))
+        # JSON records go to their own file only, not again through the root console/query-log handlers
+        qa_logger.propagate = False
+    except Exception as e:
+        logging.warning(f"Could not set up file logging: {str(e)}")
+    
+    return qa_logger
+
+_setup_qa_chain_logger()
+
+# SQL sanitizer patterns, compiled once
+_FENCE_RE = re.compile(r'```sql|```')
+# ASCII-only case folding; only the start position is matched and the rest is sliced off
+_SQL_START_RE = re.compile(r'\b(?:WITH|SELECT)\b', re.IGNORECASE | re.ASCII)
+_SPLIT_RE = re.compile(r';|\s+(?=THIS|Let me|Note)')
+_SQLPARSE_OPTIONS = {
+    'reindent': True,
+    'keyword_case': 'upper',
+    'identifier_case': 'upper',
+    'strip_comments': True,
+    'use_space_around_operators': True
+}
+
+@functools.lru_cache(maxsize=256)
+def _format_sql(query: str) -> str:
+    """Pretty-print SQL with sqlparse; regenerated queries are often identical, so keep recent results."""
+    import sqlparse
+    return sqlparse.format(query, **_SQLPARSE_OPTIONS).strip()
+
+# Interaction log size bounds - keep log writes independent of result width
+# Columns kept in the logged results sample and numeric summary
+_MAX_LOGGED_COLUMNS = 20
+_MAX_LOG_ENTRY_CHARS = 256_000
+_BULKY_LOG_FIELDS = ('results_sample', 'numeric_summary')
+
+# Longest text value sent to the LLM per cell in data context
+_MAX_PROMPT_CELL_CHARS = 80
+# Sampled rows larger than this are replaced by a per-column digest
+_MAX_SAMPLE_CONTEXT_CHARS = 8000
+
+# Rows downloaded per query; larger results are cut off here rather than exhausting worker memory
+_MAX_RESULT_ROWS = 100_000
+
+# Authenticated Snowflake sessions reused across queries, keyed by connection id
+_CONN_CACHE = {}
+_CONN_LOCK = threading.Lock()
+# Snowflake error codes for a session that no longer exists or whose token expired
+_DEAD_SESSION_ERRNOS = {390111, 390112, 390114}
+
+def _is_dead_session_error(error: Exception) -> bool:
+    """Check whether a query failed because its cached session is gone."""
+    from snowflake.connector.errors import DatabaseError
+    return isinstance(error, DatabaseError) and getattr(error, 'errno', None) in _DEAD_SESSION_ERRNOS
+
+# Query history writes only - a slow Supabase must never delay work on the request path
+_HISTORY_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='qa_chain-history')
+
+# Interaction logs waiting to be written to Supabase, as (db_manager, entry) pairs.
+# Bounded so a slow or unreachable database can't grow memory without limit.
+_LOG_QUEUE_MAX_ENTRIES = 1000
+_LOG_QUEUE = queue.Queue(maxsize=_LOG_QUEUE_MAX_ENTRIES)
+_LOG_BATCH_SIZE = 50
+_LOG_IDLE_FLUSH_SECONDS = 1.0
+_LOG_STOP = object()
+
+def _write_log_batch(batch):
+    """Write queued interaction logs with one bulk insert per database manager."""
+    by_manager = {}
+    for db_manager, entry in batch:
+        by_manager.setdefault(id(db_manager), (db_manager, []))[1].append(entry)
+    
+    for db_manager, entries in by_manager.values():
+        try:
+            if not db_manager.save_interaction_logs(entries):
+                logging.error(f"Error saving {len(entries)} interaction logs")
+        except Exception as e:
+            # Don't let logging break the main flow
+            logging.warning(f"Failed to log interactions to Supabase: {str(e)}")
+
+def _log_writer():
+    """Batch queued logs until the batch is full or the queue has been idle for a moment."""
+    while True:
+        item = _LOG_QUEUE.get()
+        if item is _LOG_STOP:
+            return
+        batch = [item]
+        stopping = False
+        while len(batch) < _LOG_BATCH_SIZE:
+            try:
+                item = _LOG_QUEUE.get(timeout=_LOG_IDLE_FLUSH_SECONDS)
+            except queue.Empty:
+                break
+            if item is _LOG_STOP:
+                stopping = True
+                break
+            batch.append(item)
+        _write_log_batch(batch)
+        if stopping:
+            return
+
+def _start_log_writer():
+    """Start the log writer thread and flush pending logs at interpreter exit."""
+    writer = threading.Thread(target=_log_writer, name='qa_chain-log-writer', daemon=True)
+    writer.start()
+    
+    def _flush():
+        try:
+            _LOG_QUEUE.put(_LOG_STOP, timeout=10)
+        except queue.Full:
+            # Writer is stuck on the database; don't hold up shutdown
+            return
+        writer.join(timeout=10)
+    
+    atexit.register(_flush)
+
+_start_log_writer()
+
+# libyaml's C loader when available; PyYAML's pure-Python loader otherwise
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+_PROMPTS_PATH = 'prompts.yaml'
+_PROMPT_CACHE = {}
+_PROMPT_CACHE_LOCK = threading.Lock()
+
+def _load_prompt_config() -> dict:
+    """Load prompts.yaml once per process, re-parsing only when the file changes."""
+    mtime = os.path.getmtime(_PROMPTS_PATH)
+    with _PROMPT_CACHE_LOCK:
+        if _PROMPT_CACHE.get('mtime') != mtime:
+            with open(_PROMPTS_PATH, 'r') as file:
+                _PROMPT_CACHE['config'] = yaml.load(file, Loader=_YamlLoader)
+            _PROMPT_CACHE['mtime'] = mtime
+        return _PROMPT_CACHE['config']
+
+def _config_fingerprint(config) -> str:
+    """Hash a schema config so edits to it are detected without walking its tables."""
+    config_json = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.blake2b(config_json.encode('utf-8'), digest_size=16).hexdigest()
+
+def _config_key(config) -> tuple:
+    """Identify the active connection's config by its contents.
+    
+    The schema editor edits config dicts in place, so the fingerprint is taken
+    from the contents on every call rather than memoized by object identity.
+    """
+    return (st.session_state.get('active_connection_id'), _config_fingerprint(config))
+
+def _session_cached(method):
+    """Cache a config-derived context string in session state for the active config.
+    
+    Streamlit reruns the script on every interaction, but these strings only change
+    when the connection or its schema config does. DataFrame arguments contribute
+    their column set to the key.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        config = args[-1]
+        if not config:
+            return method(self, *args)
+        
+        # Drop everything cached for a previous connection or config version
+        config_key = _config_key(config)
+        if st.session_state.get('_ctx_key') != config_key:
+            st.session_state['_ctx_cache'] = {}
+            st.session_state['_ctx_key'] = config_key
+        cache = st.session_state['_ctx_cache']
+        
+        key = (method.__name__,) + tuple(frozenset(arg.columns) for arg in args[:-1])
+        if key not in cache:
+            cache[key] = method(self, *args)
+        return cache[key]
+    return wrapper
+
+def _json_default(obj):
+    """Convert values the JSON encoder can't handle natively."""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
     if isinstance(obj, Decimal):
         return float(obj)
-    return obj
+    return str(obj)
+
+def _prompt_value(value):
+    """Make a cell JSON-ready for prompts: decimals as numbers, missing or non-finite values as null."""
+    # to_numpy(na_value=None) leaves NaT in datetime64 columns
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, str):
+        return value[:_MAX_PROMPT_CELL_CHARS]
+    return value
+
+# Interaction log encoding: NaN/Infinity become null, numpy scalars and non-string keys are handled natively
+_LOG_JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def _dumps_log(obj) -> str:
+    """Encode an interaction log entry as JSON."""
+    return orjson.dumps(obj, default=_json_default, option=_LOG_JSON_OPTIONS).decode('utf-8')
 
 class QueryGenerator:
     """Handles SQL query generation and execution."""
 
     def __init__(self):
         """Initialize with domain-aware prompt system."""
-        self.llm = LLMClient()
+        self.llm = get_llm_client()
         self.thread_id = str(uuid4())
         self.last_error = None
         
-        # Load domain-aware prompts
-        with open('prompts.yaml', 'r') as file:
-            prompt_config = yaml.safe_load(file)
+        # Load domain-aware prompts (parsed once per process and shared read-only)
+        prompt_config = _load_prompt_config()
         
         self.prompt_system = prompt_config['prompt_system']
         self.domains = prompt_config['domains']
@@ -65,75 +291,81 @@ class QueryGenerator:
         
         # Set default domain (could be made user-configurable later)
         self.current_domain = self.prompt_system['default_domain']
+        # Rendered SQL instruction blocks per domain (they only depend on the database type)
+        self._sql_instructions = {}
         
-        # Set up structured logging
+        # Structured logging (handlers are attached once at module import)
         self.logger = logging.getLogger('qa_chain')
-        self.logger.setLevel(logging.INFO)
-        # Add JSON formatter for structured logging
-        try:
-            os.makedirs('logs', exist_ok=True)
-            json_handler = logging.FileHandler(f'logs/qa_chain_{datetime.now().strftime("%Y%m%d")}.json')
-            json_handler.setFormatter(logging.Formatter('%(message)s'))
-            self.logger.addHandler(json_handler)
-        except Exception as e:
-            logging.warning(f"Could not set up file logging: {str(e)}")
 
     def get_domain_prompts(self):
         """Get prompts for current domain."""
         return self.domains[self.current_domain]
 
+    def _get_sql_instructions(self) -> str:
+        """Get the SQL generation instruction block for the current domain, rendered once."""
+        instructions = self._sql_instructions.get(self.current_domain)
+        if instructions is None:
+            sql_prompts = self.get_domain_prompts()['sql_generation']
+            base_role = sql_prompts['base_role'].format(database_type="Snowflake")
+            instructions = sql_prompts['system'].format(base_role=base_role)
+            self._sql_instructions[self.current_domain] = instructions
+        return instructions
+
     def _log_interaction(self, interaction_type: str, **kwargs):
         """Log structured interaction data to both file and Supabase."""
         current_time = datetime.now()
         
-        # Process kwargs for JSON compatibility
-        def json_safe_value(v):
-            if isinstance(v, (datetime, date)):
-                return v.isoformat()
-            if isinstance(v, Decimal):
-                return float(v)
-            return v
-
-        def process_payload(obj):
-            if isinstance(obj, dict):
-                return {k: process_payload(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [process_payload(i) for i in obj]
-            return json_safe_value(obj)
-
-        processed_kwargs = process_payload(kwargs)
         log_entry = {
             'timestamp': current_time.isoformat(),
             'thread_id': self.thread_id,
             'type': interaction_type,
             'database_name': st.session_state.get('active_connection_name'),
             'user_id': st.session_state.get('user_id'),
-            **processed_kwargs
+            **kwargs
         }
 
-        # Keep existing file logging
-        self.logger.info(json.dumps(log_entry))
+        # Keep existing file logging; the encoder converts only the leaves that need it
+        log_json = _dumps_log(log_entry)
+        if len(log_json) > _MAX_LOG_ENTRY_CHARS:
+            # Drop the bulky result fields rather than writing multi-MB log rows
+            truncated = {'_truncated': True, 'n_chars': len(log_json)}
+            for field in _BULKY_LOG_FIELDS:
+                if field in kwargs:
+                    kwargs[field] = truncated
+                    log_entry[field] = truncated
+            log_json = _dumps_log(log_entry)
+        self.logger.info(log_json)
 
-        # NEW: Log to Supabase regardless of user's connection
+        # NEW: Log to Supabase regardless of user's connection.
+        # Queued for the writer thread; session values are read here because
+        # worker threads have no Streamlit script context.
         try:
-            from src.database.db_manager import DatabaseManager
-            db_manager = DatabaseManager()
-            
-            success = db_manager.save_interaction_log(
-                user_id=st.session_state.get('user_id'),
-                connection_id=st.session_state.get('active_connection_id'),
-                thread_id=self.thread_id,
-                interaction_type=interaction_type,
-                database_name=st.session_state.get('active_connection_name'),
-                payload=processed_kwargs
-            )
-            
-            if not success:
-                logging.error(f"Error saving interaction log: {str(e)}")
-                
+            db_manager = get_database_manager()
         except Exception as e:
             # Don't let logging break the main flow
             logging.warning(f"Failed to log interaction to Supabase: {str(e)}")
+            return
+        
+        entry = {
+            'user_id': st.session_state.get('user_id'),
+            'connection_id': st.session_state.get('active_connection_id'),
+            'thread_id': self.thread_id,
+            'interaction_type': interaction_type,
+            'database_name': st.session_state.get('active_connection_name'),
+            'payload': kwargs,
+            # Stamp now so batching doesn't shift the stored time
+            'created_at': datetime.utcnow()
+        }
+        try:
+            _LOG_QUEUE.put_nowait((db_manager, entry))
+        except queue.Full:
+            # Never block the request on logging; the file log above still has the entry
+            logging.warning(f"Interaction log queue full, dropping {interaction_type} log for Supabase")
+
+    def _recent_history(self, count: int):
+        """Iterate the last `count` chat interactions without copying the history."""
+        chat_history = st.session_state.chat_history
+        return islice(chat_history, max(0, len(chat_history) - count), None)
 
     def _format_chat_history(self, question: str) -> str:
         """Format chat history using Streamlit session state."""
@@ -142,7 +374,7 @@ class QueryGenerator:
         
         history = []
         # Get last 3 interactions (reduced from 7 for better performance)
-        recent_history = st.session_state.chat_history[-3:]
+        recent_history = self._recent_history(3)
         
         for interaction in recent_history:
             if 'query' in interaction:
@@ -161,7 +393,7 @@ class QueryGenerator:
         
         history = []
         # Get last 4 interactions for analysis context
-        recent_history = st.session_state.chat_history[-4:]
+        recent_history = self._recent_history(4)
         
         for interaction in recent_history:
             if interaction.get('type') == 'analysis':
@@ -172,9 +404,17 @@ class QueryGenerator:
         return "\n".join(history)
 
     def _get_snowflake_connection(self):
-        """Create Snowflake connection using private key authentication only."""
-        db_manager = DatabaseManager()
-        active_conn = db_manager.get_connection(st.session_state.active_connection_id)
+        """Get a cached Snowflake connection, creating one with private key auth if needed."""
+        connection_id = st.session_state.active_connection_id
+        
+        # Reuse the open session for this connection to skip TLS + auth on every query
+        with _CONN_LOCK:
+            conn = _CONN_CACHE.get(connection_id)
+            if conn is not None and not conn.is_closed():
+                return conn
+        
+        db_manager = get_database_manager()
+        active_conn = db_manager.get_connection(connection_id)
         
         if not active_conn:
             raise ValueError("No active connection found")
@@ -187,7 +427,9 @@ class QueryGenerator:
             'user': conn_config['username'],
             'database': conn_config['database'],
             'warehouse': conn_config['warehouse'],
-            'schema': conn_config['schema']
+            'schema': conn_config['schema'],
+            # Keep the cached session alive between questions
+            'client_session_keep_alive': True
         }
         
         # Private key authentication only
@@ -220,150 +462,186 @@ class QueryGenerator:
                 private_key_content = private_key_content.replace('\\n', '\n')
                 private_key_content = private_key_content.encode('utf-8')
             
-            # Parse the private key using cryptography library
-            from cryptography.hazmat.primitives import serialization
-            from cryptography.hazmat.primitives.serialization import load_pem_private_key
-            
-            # Load the PEM private key
-            private_key_obj = load_pem_private_key(
-                private_key_content,
-                password=None  # We generated unencrypted key
-            )
-            
-            # Convert to DER format (binary) that Snowflake expects
-            private_key_der = private_key_obj.private_bytes(
-                encoding=serialization.Encoding.DER,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-            
-            connection_params['private_key'] = private_key_der
+            # Parse the PEM key and convert to the DER format (binary) Snowflake expects;
+            # cached per key, so reconnecting doesn't repeat the RSA parse
+            connection_params['private_key'] = load_private_key_der(private_key_content)
             
         except Exception as e:
             raise ValueError(f"Failed to load private key: {str(e)}")
         
-        return snowflake.connector.connect(**connection_params)
+        # Imported on first connect; the connector loads most of its package on import
+        import snowflake.connector
+        conn = snowflake.connector.connect(**connection_params)
+        with _CONN_LOCK:
+            # Another session may have connected while this one did; keep the first
+            cached = _CONN_CACHE.get(connection_id)
+            if cached is None or cached.is_closed():
+                _CONN_CACHE[connection_id] = conn
+                return conn
+        
+        # Close the losing connection so its keep-alive session doesn't linger
+        try:
+            conn.close()
+        except Exception:
+            pass
+        return cached
+
+    def _discard_snowflake_connection(self, conn):
+        """Drop a dead connection from the cache so the next query reconnects."""
+        with _CONN_LOCK:
+            for connection_id, cached in list(_CONN_CACHE.items()):
+                if cached is conn:
+                    del _CONN_CACHE[connection_id]
+        try:
+            conn.close()
+        except Exception:
+            pass
 
+    @_session_cached
     def _get_table_list(self, config) -> str:
         """Get list of available tables (v2.0 format only)."""
         if not config:
             return ""
-        return ", ".join(config.get('tables', {}).keys())
+        # Sorted so the cached system block is byte-identical however the config was stored
+        return ", ".join(sorted(config.get('tables', {})))
 
+    @_session_cached
     def _get_schema_context(self, config) -> str:
         """Get relevant schema context for queries (v2.0 format only)."""
         if not config:
             return ""
             
-        context_parts = []
+        # Every section is appended line by line to one flat list; an empty
+        # string marks the blank line between sections, so a single join at
+        # the end builds the whole context.
+        lines = []
         
         # Handle business context
-        business_context = config.get('business_context', {})
-        if business_context.get('description'):
-            context_parts.append("Business Context:\n" + business_context['description'])
-        if business_context.get('key_concepts'):
-            context_parts.append("Key Business Concepts:\n- " + "\n- ".join(business_context['key_concepts']))
+        business_context = config.get('business_context') or {}
+        if description := business_context.get('description'):
+            lines += ["Business Context:", description, ""]
+        if key_concepts := business_context.get('key_concepts'):
+            lines.append("Key Business Concepts:")
+            lines += [f"- {concept}" for concept in key_concepts]
+            lines.append("")
         
         # Handle query guidelines
-        query_guidelines = config.get('query_guidelines', {})
-        if query_guidelines.get('optimization_rules'):
-            context_parts.append("Query Guidelines:\n- " + "\n- ".join(query_guidelines['optimization_rules']))
+        query_guidelines = config.get('query_guidelines') or {}
+        if optimization_rules := query_guidelines.get('optimization_rules'):
+            lines.append("Query Guidelines:")
+            lines += [f"- {rule}" for rule in optimization_rules]
+            lines.append("")
         
         # Handle tables (v2.0 format only)
         tables = config.get('tables', {})
-        for table_name, table_info in tables.items():
-            table_parts = [f"Table: {table_name}"]
+        for table_name, table_info in sorted(tables.items()):
+            lines.append(f"Table: {table_name}")
             
             # Add table description if available
-            if table_info.get('description'):
-                table_parts.append(f"Description: {table_info['description']}")
+            if table_description := table_info.get('description'):
+                lines.append(f"Description: {table_description}")
             
             # Process fields efficiently
-            fields = []
-            for field_name, field_info in table_info.get('fields', {}).items():
-                field_desc = [f"- {field_name} ({field_info.get('type', 'TEXT')})"]
+            fields = table_info.get('fields') or {}
+            if fields:
+                lines.append("Fields:")
+            for field_name, field_info in fields.items():
+                field_line = f"- {field_name} ({field_info.get('type', 'TEXT')})"
                 
                 # Add attributes
                 attributes = []
                 if field_info.get('primary_key'):
                     attributes.append("Primary Key")
-                if field_info.get('foreign_key'):
-                    attributes.append(f"Foreign Key -> {field_info['foreign_key']}")
+                if foreign_key := field_info.get('foreign_key'):
+                    attributes.append(f"Foreign Key -> {foreign_key}")
                 if field_info.get('nullable'):
                     attributes.append("Optional")
                 if attributes:
-                    field_desc.append(f"  ({', '.join(attributes)})")
+                    field_line += f"   ({', '.join(attributes)})"
                 
                 # Add business description
-                if field_info.get('description'):
-                    field_desc.append(f"  Description: {field_info['description']}")
+                if field_description := field_info.get('description'):
+                    field_line += f"   Description: {field_description}"
                 
-                fields.append(" ".join(field_desc))
-            
-            if fields:
-                table_parts.append("Fields:\n" + "\n".join(fields))
+                lines.append(field_line)
             
-            context_parts.append("\n".join(table_parts))
+            lines.append("")
         
-        return "\n\n".join(context_parts)
+        # Drop the separator after the last section
+        if lines:
+            lines.pop()
+        return "\n".join(lines)
 
+    @_session_cached
     def _get_business_context(self, config) -> str:
         """Extract business context from config."""
-        if not config or not config.get('business_context'):
+        business_context = config.get('business_context') if config else None
+        if not business_context:
             return ""
         context = ""
-        if config['business_context'].get('description'):
-            context += f"\nBusiness Context: {config['business_context']['description']}"
-        if config['business_context'].get('key_concepts'):
-            context += f"\nKey Concepts: {', '.join(config['business_context']['key_concepts'])}"
+        if description := business_context.get('description'):
+            context += f"\nBusiness Context: {description}"
+        if key_concepts := business_context.get('key_concepts'):
+            context += f"\nKey Concepts: {', '.join(key_concepts)}"
         return context
 
+    @_session_cached
+    def _get_field_descriptions(self, config) -> list:
+        """Flatten described fields across all tables into (field_name, description) pairs."""
+        return [
+            (field_name, field_info['description'])
+            for table_info in config.get('tables', {}).values()
+            for field_name, field_info in table_info.get('fields', {}).items()
+            if field_info.get('description')
+        ]
+
+    @_session_cached
     def _get_field_context(self, df: pd.DataFrame, config) -> str:
         """Extract field context for current columns (v2.0 format only)."""
         if not config:
             return ""
-            
-        field_descriptions = []
-        tables = config.get('tables', {})
         
-        for table_info in tables.values():
-            for field_name, field_info in table_info.get('fields', {}).items():
-                if field_name in df.columns and field_info.get('description'):
-                    field_descriptions.append(f"{field_name}: {field_info['description']}")
+        # O(1) membership instead of probing the pandas Index per field
+        col_set = frozenset(df.columns)
+        field_descriptions = [
+            f"{field_name}: {description}"
+            for field_name, description in self._get_field_descriptions(config)
+            if field_name in col_set
+        ]
         
         return "\nField Descriptions:\n- " + "\n- ".join(field_descriptions) if field_descriptions else ""
 
     def _sanitize_sql(self, query: str) -> str:
         """Clean and format SQL query, ensuring only one statement."""
-        query = re.sub(r'```sql|```', '', query)
-        match = re.search(r'\b(WITH|SELECT)\b.*', query, re.IGNORECASE | re.DOTALL)
+        if '```' in query:
+            query = _FENCE_RE.sub('', query)
+        match = _SQL_START_RE.search(query)
         if not match:
             raise ValueError("No valid SQL query found in the response")
-        query = match.group(0)
-        query = re.split(r';|\s+(?=THIS|Let me|Note)', query)[0]
-        formatted = sqlparse.format(
-            query,
-            reindent=True,
-            keyword_case='upper',
-            identifier_case='upper',
-            strip_comments=True,
-            use_space_around_operators=True
+        query = query[match.start():]
+        query = _SPLIT_RE.split(query, maxsplit=1)[0]
+        return _format_sql(query)
+
+    @_session_cached
+    def _get_schema_block(self, config) -> str:
+        """Render the per-connection schema block of the SQL generation system prompt."""
+        return self.get_domain_prompts()['sql_generation']['schema'].format(
+            table_list=self._get_table_list(config),
+            schema_context=self._get_schema_context(config)
         )
-        return formatted.strip()
 
     def generate_query(self, question: str, config=None) -> str:
         """Generate SQL query using domain-specific prompts."""
         domain_prompts = self.get_domain_prompts()['sql_generation']
         
-        prompt = domain_prompts['template'].format(
-            base_role=domain_prompts['base_role'].format(database_type="Snowflake"),
-            table_list=self._get_table_list(config),
-            schema_context=self._get_schema_context(config),
+        # Domain instructions, then per-connection schema: two stable, cacheable blocks
+        system_blocks = [self._get_sql_instructions(), self._get_schema_block(config)]
+        prompt = domain_prompts['user'].format(
             question=question,
             chat_history=self._format_chat_history(question)
         )
         
-        response_content = self.llm.generate(prompt)
+        response_content = self.llm.generate(prompt, system=system_blocks)
         generated_sql = self._sanitize_sql(response_content)
         
         # Log query generation
@@ -377,19 +655,56 @@ class QueryGenerator:
 
         return generated_sql
 
+    @contextmanager
+    def _snowflake_cursor(self):
+        """Borrow a cursor on the cached connection; reconnect next time only if it died."""
+        conn = self._get_snowflake_connection()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        except Exception as e:
+            # Don't hand a dead session to the next query
+            if conn.is_closed() or _is_dead_session_error(e):
+                self._discard_snowflake_connection(conn)
+            raise
+        finally:
+            # The connection stays open in the cache; only the cursor is released
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    def _run_query(self, query: str) -> pd.DataFrame:
+        """Run a query on the cached session, reconnecting once if that session has died."""
+        from snowflake.connector.errors import DatabaseError
+        try:
+            with self._snowflake_cursor() as cursor:
+                cursor.execute(query)
+                return self._fetch_dataframe(cursor)
+        except DatabaseError as e:
+            if not _is_dead_session_error(e):
+                raise
+            logging.info("Cached Snowflake session expired, reconnecting")
+        
+        with self._snowflake_cursor() as cursor:
+            cursor.execute(query)
+            return self._fetch_dataframe(cursor)
+
     def execute_query(self, query: str) -> pd.DataFrame:
         """Execute SQL query and return formatted results."""
-        conn = None
         start_time = time.time()
         
         try:
-            conn = self._get_snowflake_connection()
-            cursor = conn.cursor()
-            cursor.execute(query)
-            columns = [desc[0] for desc in cursor.description]
-            data = cursor.fetchall()
-            df = pd.DataFrame(data, columns=columns)
-            formatted_df = format_dataframe(df)
+            df = self._run_query(query)
+            if df.empty:
+                # No rows (e.g. SHOW/DDL results or no matches) - nothing to format or summarize
+                formatted_df, numeric_summary = df, None
+            else:
+                formatted_df = format_dataframe(df)
+                # Summarize once; the log entry and later analysis prompts both reuse it
+                numeric_summary = summarize_numeric(formatted_df)
+            # Kept beside the frame, not in attrs: pandas deep-copies attrs into every derived object
+            st.session_state.current_results_summary = (formatted_df, numeric_summary)
             
             # Calculate execution time
             execution_time_ms = int((time.time() - start_time) * 1000)
@@ -402,10 +717,14 @@ class QueryGenerator:
                 'query_execution',
                 sql_query=query,
                 row_count=len(df),
+                rows_truncated=df.attrs.get('rows_truncated', False),
                 column_count=len(df.columns),
-                columns=columns,
-                results_sample=formatted_df.head(5).to_dict('records'),
-                numeric_summary=formatted_df.describe().to_dict() if not df.empty else None,
+                columns=list(df.columns),
+                results_sample=head_records(formatted_df.iloc[:, :_MAX_LOGGED_COLUMNS], 5),
+                numeric_summary=(
+                    dict(islice(numeric_summary.items(), _MAX_LOGGED_COLUMNS))
+                    if numeric_summary else numeric_summary
+                ),
                 execution_time_ms=execution_time_ms
             )
             
@@ -426,12 +745,45 @@ class QueryGenerator:
                 execution_time_ms=execution_time_ms
             )
             raise
-        finally:
-            if conn:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+
+    def _fetch_dataframe(self, cursor) -> pd.DataFrame:
+        """Fetch query results as an Arrow-backed DataFrame using Snowflake's Arrow result format.
+        
+        Column names come from the Arrow schema; the cursor description is only
+        read on the fallback paths. At most _MAX_RESULT_ROWS rows are fetched;
+        `attrs['rows_truncated']` records whether the result was cut off.
+        """
+        from snowflake.connector.errors import NotSupportedError, ProgrammingError
+        try:
+            # Arrow batches go straight into typed columns, no per-row tuples
+            batches = cursor.fetch_arrow_batches()
+        except (NotSupportedError, ProgrammingError):
+            # Non-Arrow results (e.g. SHOW) or the pandas extra isn't installed
+            rows = cursor.fetchmany(_MAX_RESULT_ROWS + 1)
+            df = pd.DataFrame(rows[:_MAX_RESULT_ROWS], columns=[desc[0] for desc in cursor.description])
+            df.attrs['rows_truncated'] = len(rows) > _MAX_RESULT_ROWS
+            return df
+        
+        # Result chunks are downloaded as they're iterated, so stop once the row cap is reached
+        tables = []
+        n_rows = 0
+        truncated = False
+        for table in batches:
+            if n_rows + table.num_rows > _MAX_RESULT_ROWS:
+                tables.append(table.slice(0, _MAX_RESULT_ROWS - n_rows))
+                truncated = True
+                break
+            tables.append(table)
+            n_rows += table.num_rows
+        
+        # Empty results come back without any batches
+        if not tables:
+            return pd.DataFrame(columns=[desc[0] for desc in cursor.description])
+        
+        # pd.ArrowDtype columns wrap the Arrow buffers instead of converting to NumPy/object arrays
+        df = pa.concat_tables(tables).to_pandas(types_mapper=pd.ArrowDtype)
+        df.attrs['rows_truncated'] = truncated
+        return df
 
     def _save_to_query_history(self, query: str, result_df: pd.DataFrame, execution_time_ms: int):
         """Save successful query to user's history."""
@@ -441,10 +793,12 @@ class QueryGenerator:
                 hasattr(st.session_state, 'active_connection_id') and st.session_state.active_connection_id and
                 hasattr(st.session_state, 'current_question') and st.session_state.current_question):
                 
-                from src.database.db_manager import DatabaseManager
-                db_manager = DatabaseManager()
+                db_manager = get_database_manager()
                 
-                db_manager.save_query_to_history(
+                # Session values are read here; the duplicate check and insert run on a
+                # worker thread (save_query_to_history logs its own failures)
+                _HISTORY_EXECUTOR.submit(
+                    db_manager.save_query_to_history,
                     user_id=st.session_state.user_id,
                     connection_id=st.session_state.active_connection_id,
                     question=st.session_state.current_question,
@@ -456,22 +810,31 @@ class QueryGenerator:
             # Don't let history saving break the main query flow
             logging.warning(f"Failed to save query to history: {str(e)}")
 
-    def analyze_result(self, df: pd.DataFrame, original_question: str, config=None) -> str:
-        """Generate analysis using domain-specific prompts."""
+    def analyze_result(self, df: pd.DataFrame, original_question: str, config=None,
+                       on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Generate analysis using domain-specific prompts.
+        
+        Pass `on_text` to stream the analysis; it receives the text so far.
+        """
         domain_prompts = self.get_domain_prompts()['analysis']
         
         business_context = self._get_business_context(config)
         field_context = self._get_field_context(df, config)
         data_context = self._prepare_data_context(df)
         
-        prompt = domain_prompts['explain_query'].format(
+        # Fixed framework first so it stays cached when the business context changes
+        system_blocks = [domain_prompts['explain_query']['system']]
+        if business_context:
+            system_blocks.append(domain_prompts['explain_query']['context'].format(
+                business_context=business_context
+            ))
+        prompt = domain_prompts['explain_query']['user'].format(
             original_question=original_question,
-            business_context=business_context,
             field_context=field_context,
             data_context=data_context
         )
         
-        response = self.llm.generate(prompt)
+        response = self.llm.generate(prompt, system=system_blocks, on_text=on_text)
         
         # Log analysis
         self._log_interaction(
@@ -484,21 +847,26 @@ class QueryGenerator:
         
         return response
 
-    def continue_analysis(self, follow_up: str, df: pd.DataFrame, original_question: str, config=None) -> str:
-        """Continue analysis using domain-specific prompts."""
+    def continue_analysis(self, follow_up: str, df: pd.DataFrame, original_question: str, config=None,
+                          on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Continue analysis using domain-specific prompts.
+        
+        Pass `on_text` to stream the response; it receives the text so far.
+        """
         domain_prompts = self.get_domain_prompts()['analysis']
         
         conversation_history = self._format_analysis_history()
         data_context = self._prepare_data_context(df)
         
-        prompt = domain_prompts['continue_discussion'].format(
+        system_prompt = domain_prompts['continue_discussion']['system']
+        prompt = domain_prompts['continue_discussion']['user'].format(
             original_question=original_question,
             follow_up=follow_up,
             conversation_history=conversation_history,
             data_context=data_context
         )
         
-        response = self.llm.generate(prompt)
+        response = self.llm.generate(prompt, system=system_prompt, on_text=on_text)
         
         # Log follow-up analysis
         self._log_interaction(
@@ -512,24 +880,70 @@ class QueryGenerator:
 
         return response
     
+    def _serialize_for_prompt(self, df: pd.DataFrame) -> str:
+        """Serialize rows as compact column-major JSON with long text cells truncated."""
+        # {column: [values]} repeats each column name once instead of once per row
+        columns = {
+            col: [_prompt_value(v) for v in series.to_numpy(dtype=object, na_value=None)]
+            for col, series in df.items()
+        }
+        # allow_nan=False: a NaN or Infinity that slips through fails here instead of reaching the model
+        return json.dumps(columns, default=str, separators=(',', ':'), allow_nan=False)
+    
+    def _numeric_summary(self, df: pd.DataFrame):
+        """Numeric summary computed by execute_query for this frame, else computed now."""
+        cached = st.session_state.get('current_results_summary')
+        if cached is not None and cached[0] is df:
+            return cached[1]
+        return summarize_numeric(df)
+    
+    def _prompt_summary(self, df: pd.DataFrame):
+        """Numeric summary rounded to 6 significant digits - full float reprs only cost tokens."""
+        summary = self._numeric_summary(df)
+        if not summary:
+            return summary
+        return {
+            col: {stat: float(f"{value:.6g}") for stat, value in stats.items()}
+            for col, stats in summary.items()
+        }
+    
     def _prepare_data_context(self, df: pd.DataFrame) -> str:
         """Prepare data context for analysis prompts."""
         if len(df) <= 50:
             # For small result sets, include all data
             return f"""
-            Full Dataset ({len(df)} rows):
-            {df.to_dict('records')}
+            Full Dataset ({len(df)} rows, column-major JSON):
+            {self._serialize_for_prompt(df)}
             """
         else:
             # For larger sets, take a smart sample
             sample_size = min(50, len(df) // 10)
-            sampled_df = df.sample(n=sample_size, random_state=42)
+            # Deterministic stride slice - evenly spread rows without a shuffled copy
+            step = max(1, len(df) // sample_size)
+            sampled_df = df.iloc[::step].head(sample_size)
+            sample_json = self._serialize_for_prompt(sampled_df)
+            
+            # Results cut off at _MAX_RESULT_ROWS must not be described as the whole result
+            if df.attrs.get('rows_truncated'):
+                row_scope = f"the first {len(df):,} rows of a larger result"
+                stats_scope = f" (first {len(df):,} rows only)"
+            else:
+                row_scope = f"{len(df)} rows"
+                stats_scope = ""
+            
+            if len(sample_json) > _MAX_SAMPLE_CONTEXT_CHARS:
+                # Wide results: per-column digest instead of raw rows
+                sample_block = f"""Column Digest ({row_scope}, {len(df.columns)} columns):
+            {json.dumps(column_digest(df, max_value_chars=_MAX_PROMPT_CELL_CHARS), default=str, separators=(',', ':'))}"""
+            else:
+                sample_block = f"""Sample Dataset ({sample_size} rows from {row_scope}, column-major JSON):
+            {sample_json}"""
+            
             return f"""
-            Sample Dataset ({sample_size} rows from {len(df)} total):
-            {sampled_df.to_dict('records')}
+            {sample_block}
             
-            Summary Statistics:
-            {df.describe().to_dict()}
+            Summary Statistics{stats_scope}:
+            {json.dumps(self._prompt_summary(df), default=str, separators=(',', ':'))}
             """
 
 # Initialize query generator
@@ -1,6 +1,7 @@
 """Chat interface UI component."""
 import streamlit as st
 import pandas as pd
+from collections import deque
 from datetime import datetime
 from typing import Union
 
@@ -10,14 +11,21 @@ from src.query.generator import (
     get_query_generator
 )
 
+# Number of chat interactions kept in session state
+MAX_CHAT_HISTORY = 10
+
 class ChatInterfaceUI:
     """Chat interface UI component."""
     
     def __init__(self, schema_editor):
         """Initialize chat interface UI component."""
         self.schema_editor = schema_editor
-        if 'chat_history' not in st.session_state:
-            st.session_state.chat_history = []
+        # Bounded deque evicts the oldest interaction on append
+        if not isinstance(st.session_state.get('chat_history'), deque):
+            st.session_state.chat_history = deque(
+                st.session_state.get('chat_history') or [],
+                maxlen=MAX_CHAT_HISTORY
+            )
 
     def _handle_sql_generation(self, prompt: str) -> Union[pd.DataFrame, str]:
         """Handle SQL generation mode."""
@@ -42,13 +50,9 @@ class ChatInterfaceUI:
                 'result': result
             })
             
-            # Limit chat history to last 10 items
-            if len(st.session_state.chat_history) > 10:
-                st.session_state.chat_history = st.session_state.chat_history[-10:]
-            
             return result
 
-    def _handle_analysis_conversation(self, prompt: str) -> str:
+    def _handle_analysis_conversation(self, prompt: str, on_text=None) -> str:
         """Handle analysis conversation mode."""
         with st.spinner("Analyzing..."):
             schema_config = self.schema_editor.db_manager.get_schema_config(st.session_state.active_connection_id)
@@ -56,7 +60,8 @@ class ChatInterfaceUI:
                 prompt,
                 st.session_state.current_results,
                 st.session_state.current_question,
-                config=schema_config.get('config') if schema_config else None
+                config=schema_config.get('config') if schema_config else None,
+                on_text=on_text
             )
             
             st.session_state.chat_history.append({
@@ -66,16 +71,15 @@ class ChatInterfaceUI:
                 'result': response
             })
             
-            # Limit chat history to last 10 items
-            if len(st.session_state.chat_history) > 10:
-                st.session_state.chat_history = st.session_state.chat_history[-10:]
-            
             return response
 
-    def handle_user_input(self, prompt: str) -> Union[pd.DataFrame, str]:
-        """Handle user input based on current mode."""
+    def handle_user_input(self, prompt: str, on_text=None) -> Union[pd.DataFrame, str]:
+        """Handle user input based on current mode.
+        
+        In analysis mode, `on_text` receives the response as it streams in.
+        """
         if st.session_state.analysis_mode:
-            return self._handle_analysis_conversation(prompt)
+            return self._handle_analysis_conversation(prompt, on_text=on_text)
         else:
             return self._handle_sql_generation(prompt)
 
@@ -155,6 +159,14 @@ class ChatInterfaceUI:
         
         if prompt := st.chat_input(placeholder):
             st.chat_message("user").write(prompt)
+            
+            if st.session_state.analysis_mode:
+                # Stream the analysis into the assistant message as it is generated
+                response_box = st.chat_message("assistant").empty()
+                result = self.handle_user_input(prompt, on_text=response_box.markdown)
+                response_box.markdown(result)
+                return
+            
             result = self.handle_user_input(prompt)
             
             msg = st.chat_message("assistant")
@@ -164,6 +176,8 @@ class ChatInterfaceUI:
                 st.session_state.current_question = prompt
                 
                 msg.dataframe(result, use_container_width=True, hide_index=True)
+                if result.attrs.get('rows_truncated'):
+                    msg.caption(f"Showing the first {len(result):,} rows - refine the question to narrow the results")
             else:
                 msg.write(result)
 
@@ -3,7 +3,7 @@ import streamlit as st
 import hashlib
 import logging
 from typing import Optional, Tuple
-from src.database.db_manager import DatabaseManager
+from src.database.db_manager import get_database_manager
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +18,8 @@ class LoginUI:
         if 'is_admin' not in st.session_state:
             st.session_state.is_admin = False
             
-        # Initialize database manager
-        self.db_manager = DatabaseManager()
+        # Shared database manager (one engine per process)
+        self.db_manager = get_database_manager()
 
     def hash_password(self, password: str) -> str:
         """Hash password using SHA-256."""
@@ -114,6 +114,7 @@ class SchemaEditorUI:
                         st.session_state.active_connection_name = selected_name
                         st.session_state.selected_table = None
                         st.session_state.current_results = None
+                        st.session_state.current_results_summary = None
                         st.session_state.current_question = None
                         st.rerun()
             
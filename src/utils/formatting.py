@@ -1,10 +1,29 @@
 """Utilities for data formatting."""
+import warnings
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 from datetime import datetime
+from typing import Optional
+
+def _is_arrow_temporal(series: pd.Series) -> bool:
+    """Check for an Arrow-backed date or timestamp column."""
+    if not isinstance(series.dtype, pd.ArrowDtype):
+        return False
+    arrow_type = series.dtype.pyarrow_dtype
+    return pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type)
+
+def _is_integral(series: pd.Series) -> bool:
+    """Check that every non-null value is a whole number, so an int cast loses nothing."""
+    values = series.dropna().to_numpy(dtype=np.float64)
+    return bool(np.isfinite(values).all() and (values == np.trunc(values)).all())
 
 def format_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    """Apply consistent formatting to DataFrame."""
+    """Apply consistent formatting to DataFrame.
+    
+    Arrow-backed (pd.ArrowDtype) columns are formatted with Arrow-native
+    operations so they stay columnar instead of becoming object arrays.
+    """
     # Create a copy to avoid modifying the original
     formatted_df = df.copy()
     
@@ -19,18 +38,27 @@ def format_dataframe(df: pd.DataFrame) -> pd.DataFrame:
             continue
         
         col_lower = col.lower()
+        is_arrow = isinstance(formatted_df[col].dtype, pd.ArrowDtype)
         
         # Date formatting
-        if isinstance(sample_val, (datetime, pd.Timestamp)) or 'date' in col_lower:
+        if _is_arrow_temporal(formatted_df[col]):
+            formatted_df[col] = formatted_df[col].dt.strftime('%Y-%m-%d')
+        elif isinstance(sample_val, (datetime, pd.Timestamp)) or 'date' in col_lower:
             formatted_df[col] = pd.to_datetime(formatted_df[col]).dt.strftime('%Y-%m-%d')
         
-        # Numeric formatting
-        elif isinstance(sample_val, (int, float, np.number)):
-            # Year values - must check first before other numeric formatting
-            if ('year' in col_lower or
-                (formatted_df[col].between(2010, 2030).all() and 
-                formatted_df[col].astype(int).astype(float).eq(formatted_df[col]).all())):
-                formatted_df[col] = formatted_df[col].astype(int)
+        # Numeric formatting (Arrow decimals surface as Decimal scalars, so check the dtype)
+        # Booleans are skipped: Python bool is an int, but Arrow has no abs/round for it
+        elif (not pd.api.types.is_bool_dtype(formatted_df[col]) and
+              (isinstance(sample_val, (int, float, np.number)) or
+               (is_arrow and pd.api.types.is_numeric_dtype(formatted_df[col])))):
+            # Year values - must check first before other numeric formatting.
+            # Only whole numbers are cast: a name match alone (e.g. YEAR_OVER_YEAR_GROWTH)
+            # can hold fractions, which a safe Arrow int cast rejects
+            if (('year' in col_lower or formatted_df[col].between(2010, 2030).all()) and
+                (is_arrow or not formatted_df[col].hasnans) and
+                _is_integral(formatted_df[col])):
+                # Arrow int64 keeps nulls instead of failing the cast
+                formatted_df[col] = formatted_df[col].astype(pd.ArrowDtype(pa.int64()) if is_arrow else int)
             
             # Currency/Sales formatting - no decimals for large amounts
             elif any(term in col_lower for term in ['sales', 'revenue', 'price', 'amount', 'cost', 'total']):
@@ -41,3 +69,107 @@ def format_dataframe(df: pd.DataFrame) -> pd.DataFrame:
                 formatted_df[col] = formatted_df[col].round(0)
     
     return formatted_df
+
+# Above this many numeric cells, summarize with one vectorized NumPy pass
+VECTORIZED_SUMMARY_MIN_CELLS = 10_000
+
+def _is_summary_numeric(dtype) -> bool:
+    """Numeric, non-boolean dtype (Arrow decimals are missed by select_dtypes('number'))."""
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+def summarize_numeric(df: pd.DataFrame) -> Optional[dict]:
+    """Describe the numeric columns of a DataFrame, or None if there are none."""
+    if df.empty:
+        return None
+    
+    numeric_cols = [col for col, dtype in df.dtypes.items() if _is_summary_numeric(dtype)]
+    if not numeric_cols:
+        return None
+    
+    numeric_df = df[numeric_cols]
+    is_arrow = any(isinstance(dtype, pd.ArrowDtype) for dtype in numeric_df.dtypes)
+    # describe() can't build its result for Arrow decimal columns, so Arrow frames always vectorize
+    if is_arrow or numeric_df.size > VECTORIZED_SUMMARY_MIN_CELLS:
+        return _describe_vectorized(numeric_df)
+    return numeric_df.describe().to_dict()
+
+def _describe_vectorized(numeric_df: pd.DataFrame) -> dict:
+    """Compute describe()-equivalent stats for all columns at once on a float64 matrix."""
+    values = numeric_df.to_numpy(dtype=np.float64, na_value=np.nan)
+    # Percentiles partition along the last axis, so give them each column as a row
+    columns_as_rows = values.T
+    # One NaN mask pass; NaN-free matrices take the plain reductions, which skip the nan* copies
+    nan_mask = np.isnan(values)
+    has_nans = nan_mask.any()
+    
+    with warnings.catch_warnings():
+        # All-NaN columns yield NaN stats, same as describe()
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        stats = {'count': (values.shape[0] - nan_mask.sum(axis=0)).astype(np.float64)}
+        if has_nans:
+            stats['mean'] = np.nanmean(values, axis=0)
+            stats['std'] = np.nanstd(values, axis=0, ddof=1)
+            stats['min'] = np.nanmin(values, axis=0)
+            quartiles = np.nanpercentile(columns_as_rows, [25, 50, 75], axis=1)
+            stats['max'] = np.nanmax(values, axis=0)
+        else:
+            stats['mean'] = values.mean(axis=0)
+            stats['std'] = values.std(axis=0, ddof=1)
+            stats['min'] = values.min(axis=0)
+            quartiles = np.percentile(columns_as_rows, [25, 50, 75], axis=1)
+            stats['max'] = values.max(axis=0)
+        stats['25%'], stats['50%'], stats['75%'] = quartiles
+    
+    # Keep describe()'s key order
+    stat_order = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+    stats = {stat: stats[stat] for stat in stat_order}
+    
+    return {
+        col: {stat: float(column_stats[i]) for stat, column_stats in stats.items()}
+        for i, col in enumerate(numeric_df.columns)
+    }
+
+def column_digest(df: pd.DataFrame, top_k: int = 5, bins: int = 10, max_value_chars: int = 80) -> dict:
+    """Summarize each column compactly: dtype, distinct and null counts, plus a
+    histogram for numeric columns or the most frequent values for the rest."""
+    digest = {}
+    n_unique = df.nunique()
+    null_counts = df.isna().sum()
+    
+    for col in df.columns:
+        series = df[col]
+        entry = {
+            'dtype': str(series.dtype),
+            'n_unique': int(n_unique[col]),
+            'nulls': int(null_counts[col])
+        }
+        
+        if _is_summary_numeric(series.dtype):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values[np.isfinite(values)]
+            if values.size:
+                counts, edges = np.histogram(values, bins=bins)
+                entry['min'] = float(values.min())
+                entry['max'] = float(values.max())
+                entry['histogram'] = {'edges': edges.round(4).tolist(), 'counts': counts.tolist()}
+        else:
+            top_values = series.value_counts().head(top_k)
+            entry['top'] = {str(value)[:max_value_chars]: int(count) for value, count in top_values.items()}
+        
+        digest[col] = entry
+    
+    return digest
+
+def head_records(df: pd.DataFrame, n: int = 5) -> list:
+    """First n rows as a list of {column: value} dicts, like df.head(n).to_dict('records').
+    
+    Built from one list per column, which avoids to_dict's per-row boxing.
+    """
+    columns = list(df.columns)
+    column_values = [
+        # Arrow nulls would come back from tolist() as pd.NA; to_dict gives None
+        series.iloc[:n].to_numpy(dtype=object, na_value=None).tolist()
+        if isinstance(series.dtype, pd.ArrowDtype) else series.iloc[:n].tolist()
+        for _, series in df.items()
+    ]
+    return [dict(zip(columns, row)) for row in zip(*column_values)]
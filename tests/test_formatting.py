@@ -0,0 +1,18 @@
+"""Tests for src.utils.formatting."""
+import pandas as pd
+import pyarrow as pa
+
+from src.utils.formatting import format_dataframe
+
+
+def test_format_dataframe_skips_arrow_bool_columns():
+    df = pd.DataFrame({
+        'IS_ACTIVE': pd.array([True, None, False], dtype=pd.ArrowDtype(pa.bool_())),
+        'TOTAL_SALES': pd.array([1500.4, 2.0, None], dtype=pd.ArrowDtype(pa.float64())),
+    })
+
+    formatted = format_dataframe(df)
+
+    assert formatted['IS_ACTIVE'].dtype == pd.ArrowDtype(pa.bool_())
+    assert formatted['IS_ACTIVE'].tolist() == [True, pd.NA, False]
+    assert formatted['TOTAL_SALES'].iloc[0] == 1500.0